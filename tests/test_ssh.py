@@ -0,0 +1,175 @@
+import os
+import socket
+import sys
+import unittest
+sys.path.append(os.path.abspath(f'{__file__}/../..'))
+sys.path.append(os.path.abspath(
+    f'{__file__}/../../xbot/framework/statics/initdir'))
+
+from unittest.mock import MagicMock
+
+from lib.ssh import SSH, SSHError, SSHTimeout, PS1, PROFILE, _Result
+
+
+PS1B = PS1.encode()
+
+
+class FakeShell(object):
+    """
+    用 socketpair 模拟 paramiko Channel(支持 select)。
+    """
+    def __init__(self, responses: dict):
+        """
+        :param responses: 命令与模拟输出的映射。
+        """
+        self._local, self._remote = socket.socketpair()
+        self._responses = responses
+
+    def fileno(self) -> int:
+        return self._local.fileno()
+
+    def send(self, data: bytes) -> None:
+        cmd = data.decode().rstrip('\r')
+        resp = self._responses.get(cmd)
+        if resp is not None:
+            self._remote.sendall(resp)
+
+    def recv(self, n: int) -> bytes:
+        return self._local.recv(n)
+
+    def close(self) -> None:
+        self._local.close()
+        self._remote.close()
+
+
+class TestResult(unittest.TestCase):
+    """
+    _Result 单元测试。
+    """
+    def test_single_chunk(self):
+        """
+        测试单个数据块的解析。
+        """
+        r = _Result('ls -l')
+        r.appendrs(b'ls -l\r\nfile1\r\nfile2\r\n' + PS1B)
+        self.assertTrue(r.finished)
+        self.assertEqual(r.purers, 'file1\nfile2')
+
+    def test_byte_by_byte(self):
+        """
+        测试逐字节到达的数据解析。
+        """
+        r = _Result('pwd')
+        for byte in b'pwd\r\n/root\r\n' + PS1B:
+            r.appendrs(bytes([byte]))
+        self.assertTrue(r.finished)
+        self.assertEqual(r.purers, '/root')
+
+    def test_empty_output(self):
+        """
+        测试无输出命令(回显后直接是提示符)的解析。
+        """
+        r = _Result('cd /tmp')
+        r.appendrs(b'cd /tmp\r\n')
+        self.assertFalse(r.finished)
+        r.appendrs(PS1B)
+        self.assertTrue(r.finished)
+        self.assertEqual(r.purers, '')
+
+    def test_end_prompt_without_newline(self):
+        """
+        测试结束提示符(后面没有换行符)单独到达时不会卡住。
+        """
+        r = _Result('ls')
+        r.appendrs(b'ls\r\nfile1\r\n')
+        self.assertFalse(r.finished)
+        r.appendrs(PS1B)
+        self.assertTrue(r.finished)
+        self.assertEqual(r.purers, 'file1')
+
+    def test_prompt_split_across_chunks(self):
+        """
+        测试结束提示符跨数据块到达时的解析。
+        """
+        r = _Result('ls')
+        r.appendrs(b'ls\r\nfile1\r\n' + PS1B[:4])
+        self.assertFalse(r.finished)
+        r.appendrs(PS1B[4:])
+        self.assertTrue(r.finished)
+        self.assertEqual(r.purers, 'file1')
+
+    def test_getrc(self):
+        """
+        测试 _getrc 解析返回码。
+        """
+        r = _Result('echo $?')
+        r.appendrs(b'echo $?\r\n0\r\n' + PS1B)
+        self.assertEqual(r._getrc(), '0')
+        r = _Result('echo $?')
+        r.appendrs(b'echo $?\r\n127\r\n' + PS1B)
+        self.assertEqual(r._getrc(), '127')
+
+    def test_getrc_bracketed_paste(self):
+        """
+        测试 bash >= 5.1 括号粘贴转义序列不影响返回码解析。
+        """
+        r = _Result('echo $?')
+        r.appendrs(b'echo $?\r\n\x1b[?2004l\r0\r\n\x1b[?2004h' + PS1B)
+        self.assertEqual(r._getrc(), '0')
+
+
+class TestSSH(unittest.TestCase):
+    """
+    SSH 单元测试(不需要 sshd,使用 FakeShell)。
+    """
+    def makessh(self, responses: dict) -> SSH:
+        """
+        创建使用 FakeShell 的 SSH 实例。
+        """
+        ssh = SSH('127.0.0.1', 'user', 'password')
+        ssh._sshclient = MagicMock()
+        ssh._sshclient.invoke_shell.side_effect = \
+            lambda: FakeShell(responses)
+        self.addCleanup(ssh.close)
+        return ssh
+
+    def test_exec(self):
+        """
+        测试 exec 执行命令并返回纯净输出。
+        """
+        ssh = self.makessh({
+            'source %s' % PROFILE:
+                b'source %s\r\n' % PROFILE.encode() + PS1B,
+            'ls': b'ls\r\nfile1\r\nfile2\r\n' + PS1B,
+            'echo $?': b'echo $?\r\n0\r\n' + PS1B
+        })
+        self.assertEqual(ssh.exec('ls'), 'file1\nfile2')
+
+    def test_exec_nonzero_rc(self):
+        """
+        测试 exec 对非零返回码抛出 SSHError。
+        """
+        ssh = self.makessh({
+            'source %s' % PROFILE:
+                b'source %s\r\n' % PROFILE.encode() + PS1B,
+            'false': b'false\r\n' + PS1B,
+            'echo $?': b'echo $?\r\n1\r\n' + PS1B
+        })
+        with self.assertRaises(SSHError):
+            ssh.exec('false')
+
+    def test_exec_timeout(self):
+        """
+        测试命令不结束时 exec 抛出 SSHTimeout。
+        """
+        ssh = self.makessh({
+            'source %s' % PROFILE:
+                b'source %s\r\n' % PROFILE.encode() + PS1B,
+            'sleep 100': b'sleep 100\r\n'
+        })
+        with self.assertRaises(SSHTimeout):
+            ssh.exec('sleep 100', timeout=0.2)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,308 @@
+"""
+SSH utilities based on paramiko.
+"""
+
+import re
+import sys
+import time
+import select
+import inspect
+import threading
+
+import paramiko
+
+from xbot.framework.logger import getlogger
+
+
+# Fixed prompt exported to interactive shells so that
+# the end of a command can be detected from the output.
+PS1 = '[sh@xbot]$ '
+
+# Profile used to initialize interactive shells.
+PROFILE = '/tmp/.xbot_profile'
+
+# Module names of `exec` callers, keyed by id of the caller's
+# code object, to avoid walking frames and reading source files
+# with `inspect.stack()` on every call.
+_MODNAME_CACHE = {}
+
+
+class SSHError(Exception):
+    """
+    Command execution error.
+    """
+    pass
+
+
+class SSHTimeout(SSHError):
+    """
+    Command execution timeout.
+    """
+    pass
+
+
+class _Result(object):
+    """
+    Output of a command executed in an interactive shell.
+    """
+    # Terminal control sequences interleaved with the output, e.g.
+    # the bracketed-paste toggles (ESC[?2004h/l) of bash >= 5.1.
+    _ANSI_RE = re.compile(rb'\x1b\[[0-9;?]*[a-zA-Z]')
+
+    # States of the output scan: first find the completed line
+    # echoing the command, then find the prompt printed after the
+    # command finished.
+    _SEARCH_ECHO, _SEARCH_END = range(2)
+
+    def __init__(self, cmd: str, ps1: str = PS1):
+        """
+        :param cmd: executed command.
+        :param ps1: shell prompt.
+        """
+        self._cmd_b = cmd.encode()
+        self._ps1_b = ps1.encode()
+        self._rs = bytearray()
+        self._scan_off = 0
+        self._state = self._SEARCH_ECHO
+        self._purers = ''
+        self._purers_key = None
+        self._start = None
+        self._end = None
+
+    @property
+    def finished(self) -> bool:
+        """
+        Whether the prompt after the command has arrived.
+        """
+        return self._end is not None
+
+    @property
+    def purers(self) -> str:
+        """
+        Output without the echoed command and prompts.
+
+        Built lazily: the decode runs only when the output changed
+        since the last read, not once per received chunk.
+        """
+        if self._start is None:
+            return ''
+        key = (self._end, len(self._rs))
+        if key != self._purers_key:
+            end = self._end if self._end is not None else len(self._rs)
+            # Strip and normalize at bytes level so the decode is the
+            # only full-size string allocation.
+            self._purers = self._rs[self._start:end].strip().replace(
+                b'\r\n', b'\n').decode(errors='ignore')
+            self._purers_key = key
+        return self._purers
+
+    def appendrs(self, data: bytes) -> None:
+        """
+        Append a received chunk of output.
+
+        The output is kept as received: prompt detection works on
+        the raw bytes, and decoding happens only when `purers` is
+        actually read.
+
+        :param data: received chunk.
+        """
+        self._rs += data
+        self._locate_purers()
+
+    def _locate_purers(self) -> None:
+        """
+        Locate the pure output in the received output: starts after
+        the line echoing the command, and ends before the prompt
+        printed after the command finished.
+
+        A two-state machine driven by `bytes.find` from a persistent
+        offset.  `_SEARCH_ECHO` walks completed lines until one ends
+        with the command: the echo never carries the prompt, because
+        the prompt printed before it was consumed by the previous
+        command's result as its end marker.  `_SEARCH_END` then looks
+        for the next prompt, which arrives without a trailing newline.
+        """
+        rs = self._rs
+        while True:
+            if self._state == self._SEARCH_ECHO:
+                nl = rs.find(b'\n', self._scan_off)
+                if nl < 0:
+                    # The echoed command line is not complete yet.
+                    return
+                if rs[self._scan_off:nl].rstrip(b'\r').endswith(self._cmd_b):
+                    self._start = nl + 1
+                    self._state = self._SEARCH_END
+                self._scan_off = nl + 1
+            else:
+                idx = rs.find(self._ps1_b, self._scan_off)
+                if idx < 0:
+                    # Keep enough overlap to catch a prompt split
+                    # across chunk boundaries.
+                    self._scan_off = max(self._scan_off,
+                                         len(rs) - len(self._ps1_b) + 1)
+                    return
+                self._end = idx
+                return
+
+    def _getrc(self) -> str:
+        """
+        Parse the output of `echo $?` for a return code.
+
+        :return: return code string, '' if not found.
+        """
+        for line in bytes(self._rs).split(b'\n'):
+            if self._ps1_b in line:
+                continue
+            rc = self._ANSI_RE.sub(b'', line).strip()
+            if rc.isdigit():
+                return rc.decode()
+        return ''
+
+
+class SSH(object):
+    """
+    SSH connection supporting command execution in interactive shells.
+
+    An interactive shell is created on demand for each caller module
+    and thread, and reused by subsequent `exec` calls from the same
+    place, so that environment variables and working directory persist
+    between commands.
+    """
+    def __init__(self, host: str, user: str, password: str, port: int = 22):
+        """
+        :param host: host to connect.
+        :param user: login user.
+        :param password: login password.
+        :param port: ssh port.
+        """
+        self._host = host
+        self._user = user
+        self._password = password
+        self._port = port
+        self._sshclient = paramiko.SSHClient()
+        self._sshclient.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+        self._sftp = None
+        self._shells = {}
+        # Guards _shells: exec may be called from concurrent test
+        # threads, each adding its own shell to the shared dict.
+        self._shells_lock = threading.Lock()
+        self._shenvs = {
+            'PS1': PS1,
+            'LANG': 'en_US.UTF-8',
+            'HISTFILE': '/dev/null'
+        }
+        self._logger = getlogger('ssh.%s' % host)
+
+    def connect(self) -> None:
+        """
+        Connect to the host and prepare the shell profile.
+        """
+        self._logger.info('Connecting to %s:%s...', self._host, self._port)
+        self._sshclient.connect(self._host, self._port,
+                                self._user, self._password)
+        # Opening an SFTP channel needs a full subsystem handshake,
+        # so keep one session for reuse by all transfers.
+        self._sftp = self._sshclient.open_sftp()
+        self._mkprofile()
+
+    def close(self) -> None:
+        """
+        Close all shells and the connection.
+        """
+        with self._shells_lock:
+            shells, self._shells = self._shells, {}
+        for shell in shells.values():
+            shell.close()
+        if self._sftp:
+            self._sftp.close()
+            self._sftp = None
+        self._sshclient.close()
+
+    def shell_names(self) -> list:
+        """
+        Names of the opened interactive shells.
+        """
+        with self._shells_lock:
+            return list(self._shells.keys())
+
+    def exec(self, cmd: str, timeout: int = 60) -> str:
+        """
+        Execute `cmd` in the caller's interactive shell.
+
+        :param cmd: command to execute.
+        :param timeout: seconds to wait for the command to finish.
+        :return: pure output of the command.
+        :raises SSHError: if the command exits with nonzero code.
+        :raises SSHTimeout: if the command does not finish in time.
+        """
+        callercode = sys._getframe(1).f_code
+        callermod = _MODNAME_CACHE.get(id(callercode))
+        if callermod is None:
+            callermod = inspect.getmodulename(callercode.co_filename) or ''
+            _MODNAME_CACHE[id(callercode)] = callermod
+        shname = '%s-%s' % (callermod, threading.current_thread().name)
+        shell = self._getshell(shname)
+        self._logger.info('exec(%s): %s', shname, cmd)
+        result = self._exec(shell, cmd, timeout)
+        rc = self._exec(shell, 'echo $?', 10)._getrc()
+        if rc != '0':
+            raise SSHError('exec `%s` failed(rc=%s):\n%s'
+                           % (cmd, rc, result.purers))
+        return result.purers
+
+    def _getshell(self, name: str) -> paramiko.Channel:
+        """
+        Get or create the interactive shell with `name`.
+        """
+        with self._shells_lock:
+            shell = self._shells.get(name)
+        if shell is None:
+            self._logger.debug('Opening shell `%s`...', name)
+            shell = self._sshclient.invoke_shell()
+            self._exec(shell, 'source %s' % PROFILE, 10)
+            with self._shells_lock:
+                self._shells[name] = shell
+        return shell
+
+    def _exec(self, shell: paramiko.Channel, cmd: str,
+              timeout: int) -> _Result:
+        """
+        Send `cmd` to `shell` and wait for the prompt after it.
+
+        Waits with a blocking `select` on the channel instead of a
+        sleep polling loop, so that each chunk of output is consumed
+        as soon as it arrives.
+
+        :param shell: interactive shell.
+        :param cmd: command to execute.
+        :param timeout: seconds to wait for the command to finish.
+        :return: _Result instance.
+        """
+        result = _Result(cmd)
+        shell.send((cmd + '\r').encode())
+        deadline = time.monotonic() + timeout
+        while not result.finished:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise SSHTimeout('exec `%s` timed out after %s second(s):\n%s'
+                                 % (cmd, timeout, result.purers))
+            ready, _, _ = select.select([shell], [], [], remaining)
+            if not ready:
+                continue
+            data = shell.recv(4096)
+            if not data:
+                raise SSHError('Connection closed by remote host.')
+            result.appendrs(data)
+        return result
+
+    def _mkprofile(self) -> None:
+        """
+        Write the profile used to initialize interactive shells.
+        """
+        # One write per profile: each SFTPFile.write costs a
+        # request/ack round-trip, so send the whole payload at once.
+        payload = ''.join('export %s="%s"\n' % (k, v)
+                          for k, v in self._shenvs.items()).encode()
+        with self._sftp.open(PROFILE, 'wb') as fp:
+            fp.set_pipelined(True)
+            fp.write(payload)
@@ -8,13 +8,15 @@ import os
 import re
 import sys
 import ctypes
+import errno
 import operator
+import select
 import socket
 
 import jinja2
 
 from typing import Any, Iterator, Tuple, List
-from functools import reduce, partial
+from functools import reduce, partial, lru_cache
 from contextlib import contextmanager
 
 from xbot.framework.logger import getlogger
@@ -67,19 +69,31 @@ def xprint(*values, **kwargs) -> None:
 printerr = partial(xprint, file=sys.stderr, color='red', do_exit=True, exit_code=1)
 
 
+_JINJA_ENV = jinja2.Environment()
+
+# Compiled templates keyed by (abspath, mtime), so repeated renders
+# of the same file (e.g. one log per testcase) skip the parse and
+# compile, while edited files are still picked up.
+_TPL_CACHE = {}
+
+
 def render_write(template: str, outfile: str, **kwargs) -> None:
     """
     Render `template` and write to `outfile`.
-    
+
     :param template: template file.
     :param outfile: output file.
     """
-    rendered_content = ''
-    with open(template, encoding='utf8') as fp:
-        tpl = jinja2.Template(fp.read())
-        rendered_content = tpl.render(**kwargs)
-    if not os.path.exists(os.path.dirname(outfile)):
-        os.makedirs(os.path.dirname(outfile))
+    key = (os.path.abspath(template), os.path.getmtime(template))
+    tpl = _TPL_CACHE.get(key)
+    if tpl is None:
+        with open(template, encoding='utf8') as fp:
+            tpl = _JINJA_ENV.from_string(fp.read())
+        _TPL_CACHE[key] = tpl
+    rendered_content = tpl.render(**kwargs)
+    outdir = os.path.dirname(outfile)
+    if outdir:
+        os.makedirs(outdir, exist_ok=True)
     with open(outfile, 'w', encoding='utf8') as fp:
         fp.write(rendered_content)
 
@@ -118,13 +132,24 @@ def parse_deepkey(deepkey: str, sep: str = '.') -> list:
     :param sep: separator.
     :return: list of keys.
     """
+    return list(_parse_deepkey_cached(deepkey, sep))
+
+
+@lru_cache(maxsize=4096)
+def _parse_deepkey_cached(deepkey: str, sep: str) -> tuple:
+    """
+    Cached implementation of `parse_deepkey`.
+
+    Returns a tuple so that cached results are immutable and safe
+    to share between callers.
+    """
     keys = []
-    for k in re.split(r'%s|\[' % re.escape(sep), deepkey):
+    for k in deepkey.replace('[', sep).split(sep):
         if k.endswith(']') and k[:-1].isdigit():
             keys.append(int(k[:-1]))
         else:
             keys.append(k)
-    return keys
+    return tuple(keys)
 
 
 def deepget(obj, deepkey: str, sep: str = '.') -> Any:
@@ -147,7 +172,7 @@ def deepget(obj, deepkey: str, sep: str = '.') -> Any:
     :param sep: separator.
     :return: value.
     """
-    keys = parse_deepkey(deepkey, sep)
+    keys = _parse_deepkey_cached(deepkey, sep)
     return reduce(operator.getitem, keys, obj)
 
 
@@ -177,7 +202,7 @@ def deepset(obj: Any, deepkey: str, value: Any, sep: str = '.') -> None:
     :param value: value to set.
     :param sep: separator.
     """
-    keys = parse_deepkey(deepkey, sep)
+    keys = _parse_deepkey_cached(deepkey, sep)
     for k in keys[:-1]:
         try:
             obj = operator.getitem(obj, k)
@@ -187,6 +212,34 @@ def deepset(obj: Any, deepkey: str, value: Any, sep: str = '.') -> None:
     operator.setitem(obj, keys[-1], value)
 
 
+def _try_connect(ip: str, port: int, timeout: float) -> int:
+    """
+    Try a nonblocking connect to (ip, port).
+
+    :param ip: IP address or hostname(IPv4/IPv6).
+    :param port: port number.
+    :param timeout: seconds to wait for the connect to finish.
+    :return: 0 if connected, otherwise an errno value.
+    """
+    try:
+        family, socktype, proto, _, addr = socket.getaddrinfo(
+            ip, port, type=socket.SOCK_STREAM)[0]
+    except OSError as e:
+        return e.errno or errno.EIO
+    sock = socket.socket(family, socktype, proto)
+    sock.setblocking(False)
+    try:
+        sock.connect_ex(addr)
+        _, writable, _ = select.select([], [sock], [], timeout)
+        if not writable:
+            return errno.ETIMEDOUT
+        return sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR)
+    except OSError as e:
+        return e.errno or errno.EIO
+    finally:
+        sock.close()
+
+
 def ip_reachable(ip: str) -> bool:
     """
     Check if IP is reachable.
@@ -196,33 +249,22 @@ def ip_reachable(ip: str) -> bool:
     >>> ip_reachable('128.0.0.1')
     False
 
-    :param ip: IP address.
+    :param ip: IP address or hostname(IPv4/IPv6).
     :return: reachable return True, otherwise False.
     """
-    try:
-        conn = socket.create_connection((ip, 22), 0.1)
-        conn.close()
-        return True
-    except ConnectionRefusedError:
-        return True
-    except:
-        return False
+    # A refused connection still proves the host is reachable.
+    return _try_connect(ip, 22, 0.1) in (0, errno.ECONNREFUSED)
 
 
 def port_opened(ip: str, port: int) -> bool:
     """
     Check if port is opened.
 
-    :param ip: IP address.
+    :param ip: IP address or hostname(IPv4/IPv6).
     :param port: port number.
     :return: opened return True, otherwise False.
     """
-    try:
-        conn = socket.create_connection((ip, port), 0.1)
-        conn.close()
-        return True
-    except:
-        return False
+    return _try_connect(ip, port, 0.1) == 0
     
 
 def wrapstr(s: str, title: str = '') -> str:
@@ -247,10 +289,13 @@ def wrapstr(s: str, title: str = '') -> str:
     :param title: title.
     """
     lines = s.splitlines()
-    width = max(len(line) for line in lines + [title])
+    width = len(title)
+    for line in lines:
+        if len(line) > width:
+            width = len(line)
     return '\n'.join([
         '+' + title.center(width + 2, '-') + '+',
-        *('| %s |' % line.ljust(width) for line in lines),
+        *(f'| {line:<{width}} |' for line in lines),
         '+' + '-' * (width + 2) + '+'
     ])
 
@@ -283,19 +328,22 @@ def ordered_walk(path: str) -> Iterator[Tuple[str, List[str], List[str]]]:
     :param path: directory path.
     :yield: (top, dirs, files)
     """
-    top, dirs, files = path, [], []
-    with os.scandir(path) as it:
-        for entry in it:
-            if entry.is_dir():
-                dirs.append(entry.name)
-            elif entry.is_file():
-                files.append(entry.name)
-    dirs.sort()
-    files.sort()
-    yield top, dirs, files
-    for d in dirs:
-        for t in ordered_walk(os.path.join(path, d)):
-            yield t
+    stack = [path]
+    while stack:
+        top = stack.pop()
+        direntries, files = [], []
+        with os.scandir(top) as it:
+            for entry in it:
+                if entry.is_dir():
+                    direntries.append(entry)
+                elif entry.is_file():
+                    files.append(entry.name)
+        direntries.sort(key=lambda e: e.name)
+        files.sort()
+        yield top, [e.name for e in direntries], files
+        # Push in reverse so that subdirectories are walked in order.
+        for e in reversed(direntries):
+            stack.append(e.path)
 
 
 def assertx(